@@ -2,28 +2,16 @@ import dspy
 import asyncio
 import re
 import yaml
-import chardet
 import json
 import os
+import functools
+import contextlib
+import pathlib
+import inspect
+import mmap
+from llm import lm
+from file_io import safe_read_file
 
-def safe_read_file(file_path: str) -> str:
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
-    except UnicodeDecodeError:
-        try:
-            with open(file_path, "rb") as f:
-                raw_data = f.read()
-                detected = chardet.detect(raw_data)
-                encoding = detected["encoding"] or "latin-1"
-            
-            with open(file_path, "r", encoding=encoding) as f:
-                return f.read()
-        except (UnicodeDecodeError, LookupError):
-            with open(file_path, "r", encoding="latin-1") as f:
-                return f.read()
-    except FileNotFoundError:
-        raise FileNotFoundError(f"File not found: {file_path}")
 
 class CurlGenerator(dspy.Signature):
     """You are an agent that generates mock curl commands to call the API at:
@@ -38,60 +26,195 @@ class CurlGenerator(dspy.Signature):
     task_description: str = dspy.InputField(desc="The task description")
     curl_command: str = dspy.OutputField(desc="The mock curl command to call the API")
 
-dspy.configure(lm=dspy.LM("openai/gpt-4.1-nano", cache=False, cache_in_memory=False))
+_CURL_ADAPTER = dspy.ChatAdapter()
+_MODEL_INFO_SENTINEL = "\x00model_info\x00"
+
+# The mock curl prompt is fixed, so by default skip the DSPy adapter and send it as-is through
+# the shared LM. Set CURL_GENERATOR_USE_DSPY=1 to use the DSPy-rendered prompt for prompt experiments.
+USE_DSPY = os.getenv("CURL_GENERATOR_USE_DSPY", "0") == "1"
+_CURL_SYSTEM_PROMPT = inspect.cleandoc(CurlGenerator.__doc__)
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent
+TOOLS_DIR = BASE_DIR / "tools"
+PROBLEMS_DIR = BASE_DIR / "problems"
+
+_PLACEHOLDER_RE = re.compile(
+    r'("(?:image_data|data)"\s*:\s*")([^"]*base64[^"]*)(")'
+    r'|"audio_data"\s*:\s*\[[^\]]*\]'
+    r'|"sampling_rate"\s*:\s*\d+'
+)
+_PLACEHOLDER_KEYS = ('"data"', '"image_data"', '"audio_data"', '"sampling_rate"')
+_BODY_RE = re.compile(r"(?:-d|--data(?:-raw|-binary)?)\s+'(\{.*\})'", re.DOTALL)
+_BASE64_SENTINEL = "@@BASE64_IMAGE@@"
+_AUDIO_SENTINEL = "@@AUDIO_DATA@@"
+_SAMPLING_RATE_SENTINEL = "@@SAMPLING_RATE@@"
+# Sentinels as they appear in the serialized body; the base64 one sits inside its string quotes
+_SENTINEL_RE = re.compile(r'"@@(?:AUDIO_DATA|SAMPLING_RATE)@@"|@@BASE64_IMAGE@@')
+_FENCE_RE = re.compile(r"^```[\w-]*\n?|\n?```$")
+
+@functools.lru_cache(maxsize=None)
+def _render_curl_prompt() -> tuple:
+    # Render the adapter prompt once with a sentinel; only model_info changes between calls
+    messages = _CURL_ADAPTER.format(
+        CurlGenerator,
+        demos=[],
+        inputs={"model_info": _MODEL_INFO_SENTINEL, "task_description": "curl"},
+    )
+    prefix, suffix = messages[-1]["content"].split(_MODEL_INFO_SENTINEL)
+    return messages[:-1], prefix, suffix
+
+async def _complete(messages: list) -> str:
+    # Both paths go through the shared LM, with its per-loop connection pool and retries
+    outputs = await lm.acall(messages=messages)
+    if not outputs or not outputs[0]:
+        # A refusal or tool-call response carries no text content
+        raise ValueError("The LM returned no curl command (empty or refused response)")
+    return outputs[0]
+
+async def _generate_curl_command(model_info: dict) -> str:
+    model_info_json = json.dumps(model_info)
+    if USE_DSPY:
+        # DSPy's own LM cache covers repeated prompts on this path
+        system_messages, prefix, suffix = _render_curl_prompt()
+        output = await _complete([*system_messages, {"role": "user", "content": prefix + model_info_json + suffix}])
+        return _CURL_ADAPTER.parse(CurlGenerator, output)["curl_command"]
+
+    # The prompt is byte-identical for the same model_info, so the LM's memory and disk caches
+    # answer repeats, across processes too
+    output = await _complete([
+        {"role": "system", "content": _CURL_SYSTEM_PROMPT},
+        {"role": "user", "content": model_info_json},
+    ])
+    return _FENCE_RE.sub("", output.strip())
+
+@functools.lru_cache(maxsize=None)
+def _load_tool(name: str) -> str:
+    # Tool assets are static, read each one from disk only once
+    path = TOOLS_DIR / name
+    if name != "base64_image.txt" or path.stat().st_size == 0:
+        return path.read_text()
+
+    # Decode the large base64 blob straight from the page cache instead of read() + decode copies
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return str(mm, "ascii")
+
+# Resolved once at import instead of on every parse
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+@functools.lru_cache(maxsize=100)
+def _parse_task_yaml(path: str, mtime_ns: int, size: int) -> dict:
+    # Keyed on mtime and size so an edited task.yaml is parsed again. lru_cache is safe to call
+    # from the concurrent to_thread workers of generate_curls.
+    return yaml.load(safe_read_file(path), Loader=_YAML_LOADER)
+
+def _load_task_yaml(path: str) -> dict:
+    st = os.stat(path)
+    return _parse_task_yaml(path, st.st_mtime_ns, st.st_size)
+
+def _write_file(file_path: str, content: str):
+    # Binary write; the curl + base64 payload is ASCII so UTF-8 encoding is a plain copy. The
+    # buffered writer loops until every byte is written, unlike a raw FileIO's single write()
+    with open(file_path, "wb") as f:
+        f.write(content.encode("utf-8"))
+
+@functools.lru_cache(maxsize=None)
+def _payload_fragments() -> dict:
+    # Tool data kept as ready-made JSON text, keyed by the serialized sentinel it replaces.
+    # audio_data.txt already holds a JSON array literal, so it is never parsed or re-dumped.
+    return {
+        _BASE64_SENTINEL: _load_tool("base64_image.txt").strip(),
+        json.dumps(_AUDIO_SENTINEL): _load_tool("audio_data.txt").strip(),
+        json.dumps(_SAMPLING_RATE_SENTINEL): str(int(_load_tool("sampling_rate.txt"))),
+    }
+
+def _fill_payload(payload):
+    # Mark mock placeholders in the parsed request body; the tool data is spliced in
+    # after serialization so json.dumps never touches the large values
+    if isinstance(payload, dict):
+        for key, value in payload.items():
+            if key in ("data", "image_data") and isinstance(value, str) and "base64" in value:
+                payload[key] = _BASE64_SENTINEL
+            elif key == "audio_data" and isinstance(value, list):
+                payload[key] = _AUDIO_SENTINEL
+            elif key == "sampling_rate" and isinstance(value, int):
+                payload[key] = _SAMPLING_RATE_SENTINEL
+            else:
+                _fill_payload(value)
+    elif isinstance(payload, list):
+        for item in payload:
+            _fill_payload(item)
 
 async def generate_curl_for_task(task_name: str):
-    # Get base directory
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Read tool data
-    tools_dir = os.path.join(base_dir, "tools")
-    with open(os.path.join(tools_dir, "base64_image.txt"), "r") as f:
-        BASE64_IMAGE = f.read()
-    
-    with open(os.path.join(tools_dir, "audio_data.txt"), "r") as f:
-        AUDIO_DATA = f.read()
-    
-    with open(os.path.join(tools_dir, "sampling_rate.txt"), "r") as f:
-        SAMPLING_RATE = f.read()
+    task_dir = PROBLEMS_DIR / task_name
 
-    # Read task.yaml
-    task_yaml_path = os.path.join(base_dir, "problems", task_name, "task.yaml")
-    task_yaml_content = safe_read_file(task_yaml_path)
-    task_data = yaml.safe_load(task_yaml_content)
+    # Read task.yaml off the event loop
+    task_data = await asyncio.to_thread(_load_task_yaml, str(task_dir / "task.yaml"))
     model_info = task_data.get("model_information", {})
-    
-    # Generate curl command
-    curl_generator = dspy.ChainOfThought(CurlGenerator)
-    result = await curl_generator.acall(
-        model_info=json.dumps(model_info),
-        task_description="curl"
-    )
-    
-    # Process and save curl command
-    curl_command = result.curl_command
-    curl_command = re.sub(
-        r'("(?:image_data|data)"\s*:\s*")([^"]*base64[^"]*)(")', 
-        rf'\1{BASE64_IMAGE}\3', 
-        curl_command
+
+    # Tool data is only needed after generation, so read it while the LM call is in flight
+    tools_future = asyncio.gather(
+        asyncio.to_thread(_load_tool, "base64_image.txt"),
+        asyncio.to_thread(_load_tool, "audio_data.txt"),
+        asyncio.to_thread(_load_tool, "sampling_rate.txt"),
     )
-    curl_command = re.sub(r'"audio_data"\s*:\s*\[[^\]]*\]', f'"audio_data": {AUDIO_DATA}', curl_command)
-    curl_command = re.sub(r'"sampling_rate"\s*:\s*\d+', f'"sampling_rate": {SAMPLING_RATE}', curl_command)
+
+    # Generate curl command
+    try:
+        curl_command = await _generate_curl_command(model_info)
+    except BaseException:
+        # Settle the reads before propagating, so their outcome is never left unretrieved
+        tools_future.cancel()
+        with contextlib.suppress(Exception, asyncio.CancelledError):
+            await tools_future
+        raise
+    BASE64_IMAGE, AUDIO_DATA, SAMPLING_RATE = await tools_future
     
-    output_path = os.path.join(base_dir, "problems", task_name, "curl_command_generated.txt")
-    with open(output_path, "w") as f:
-        f.write(curl_command)
+    # Process and save curl command; skip all parsing when no placeholder key is present
+    if any(key in curl_command for key in _PLACEHOLDER_KEYS):
+        body_match = _BODY_RE.search(curl_command)
+        try:
+            body = json.loads(body_match.group(1)) if body_match else None
+        except json.JSONDecodeError:
+            body = None
+
+        if isinstance(body, dict):
+            # Single pass over the JSON body instead of three regex scans of the command
+            _fill_payload(body)
+            fragments = _payload_fragments()
+            body_json = _SENTINEL_RE.sub(lambda m: fragments[m.group(0)], json.dumps(body))
+            curl_command = curl_command[:body_match.start(1)] + body_json + curl_command[body_match.end(1):]
+        else:
+            # One scan over the command; the function replacement inserts the assets literally
+            def _replace(m):
+                if m.group(1):
+                    return m.group(1) + BASE64_IMAGE + m.group(3)
+                if m.group(0).startswith('"audio_data"'):
+                    return f'"audio_data": {AUDIO_DATA}'
+                return f'"sampling_rate": {SAMPLING_RATE}'
+
+            curl_command = _PLACEHOLDER_RE.sub(_replace, curl_command)
+
+    output_path = str(task_dir / "curl_command_generated.txt")
+    await asyncio.to_thread(_write_file, output_path, curl_command)
     
     return curl_command
 
-# Original main preserved for single-task execution
+async def generate_curls(task_names, concurrency: int = 16):
+    # Generate curl commands for several tasks concurrently, bounded by a semaphore
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _one(task_name):
+        async with sem:
+            return await generate_curl_for_task(task_name)
+
+    return await asyncio.gather(*(_one(task_name) for task_name in task_names))
+
 async def main():
     import sys
     if len(sys.argv) < 2:
-        print("Usage: python agent_curl_generator.py <task_name>")
+        print("Usage: python agent_curl_generator.py <task_name> [<task_name> ...]")
         sys.exit(1)
-    task_name = sys.argv[1]
-    await generate_curl_for_task(task_name)
+    await generate_curls(sys.argv[1:])
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
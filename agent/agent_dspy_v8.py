@@ -1,36 +1,379 @@
 import dspy
+import asyncio
 import yaml
 import json
+import orjson
 import os
 import re
-import chardet
+import sys
+import hashlib
+import threading
+import codecs
+import functools
+import contextlib
+import concurrent.futures
+import importlib.util
+import logging
+from html.parser import HTMLParser
+import diskcache
+import cachetools
+import litellm
 from typing import Tuple
-from dotenv import load_dotenv
+import numpy as np
+from dspy.dsp.utils.settings import thread_local_overrides
+from llm import lm, embedder, get_batch_lm, warm_connection, BatchLM
+from file_io import safe_read_file, _decode_bytes
 
-load_dotenv()
+log = logging.getLogger(__name__)
 
-lm = dspy.LM("openai/gpt-4.1-nano", api_key=os.getenv("OPENAI_API_KEY"), cache=False, cache_in_memory=False, max_tokens=32000)
-dspy.configure(lm=lm)
+# Resolved once at import instead of on every parse
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
 
+# Upper bound on concurrent LM requests issued by one UIGenerator run
+LM_CONCURRENCY = int(os.getenv("UI_LM_CONCURRENCY", "8"))
 
-def safe_read_file(file_path: str) -> str:
+# Token budget for the curl/response payload excerpts shown to the LM (head + tail)
+PAYLOAD_TOKEN_BUDGET = 512
+
+# Bytes read from each end of a payload file: enough for the token excerpt's character windows
+PAYLOAD_READ_WINDOW = PAYLOAD_TOKEN_BUDGET // 2 * 16 * 4
+_UTF8_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+
+# LLMLingua-2 payload compression is opt-in (UI_PAYLOAD_COMPRESSION=1, and the optional llmlingua
+# package installed), since it can drop payload fields from the prompts
+PAYLOAD_COMPRESSION = os.getenv("UI_PAYLOAD_COMPRESSION", "0") == "1"
+# Share of payload tokens kept when compression is on; 1 turns it off
+PAYLOAD_COMPRESSION_RATE = float(os.getenv("UI_PAYLOAD_COMPRESSION_RATE", "0.55"))
+_LLMLINGUA_MODEL = "microsoft/llmlingua-2-bert-base-multilingual-cased-meetingbank"
+# Structural characters the LM needs to read the payload shape back, never dropped
+_PAYLOAD_FORCE_TOKENS = ["{", "}", "[", "]", ":", ",", '"', "\n"]
+
+# Minimum cosine similarity for reusing the analysis of a structurally similar task
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("UI_SEMANTIC_CACHE_THRESHOLD", "0.97"))
+_SEMANTIC_INDEX_KEY = "semantic_index:analyze_task"
+# Same for components, with one index per task type so tasks never borrow each other's snippets
+COMPONENT_SEMANTIC_THRESHOLD = float(os.getenv("UI_COMPONENT_SEMANTIC_THRESHOLD", "0.95"))
+_COMPONENT_INDEX_PREFIX = "semantic_index:generate_component:"
+
+# Sampling for the mechanical layout and validation passes, so identical inputs give identical
+# outputs and reruns hit the DSPy LM cache
+DETERMINISTIC_CONFIG = dict(temperature=0, seed=42)
+
+# A quoted JSON object key: the quoted word followed by a colon
+_PAYLOAD_KEY_RE = re.compile(r'"(\w+)"\s*:')
+
+# Trailing spaces and tabs at line ends, dropped before task.yaml is hashed or prompted
+_TRAILING_WS_RE = re.compile(r"[ \t]+$", re.MULTILINE)
+
+# The generated page, from the first <html to the first </html> after it
+_HTML_BLOCK_RE = re.compile(r"<html.*?</html>", re.IGNORECASE | re.DOTALL)
+# Markdown fences around generated code, plus the escaped \` and \$ to unescape
+_FENCE_RE = re.compile(r"```(?:html|javascript|python)?\n|\n```|\\([`$])")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROBLEMS_DIR = os.path.join(BASE_DIR, "problems")
+# Few-shot demos bootstrapped offline by compile.py, loaded when present
+COMPILED_PROGRAM_PATH = os.path.join(BASE_DIR, "ui_generator.json")
+
+# Step results keyed by a hash of their inputs, so re-runs on an unchanged task skip the LM
+_RESULT_CACHE = diskcache.Cache(os.path.join(BASE_DIR, ".cache", "ui_generator"))
+# In-process tier in front of it, so repeated steps within a process skip the disk and unpickling
+_MEMORY_CACHE = cachetools.LRUCache(maxsize=1024)
+_MEMORY_CACHE_LOCK = threading.Lock()
+
+
+def _step_cache_key(name: str, predictor, kwargs: dict) -> str:
+    # Demos change the prompt, so a compiled program does not reuse zero-shot results
+    demos = [p.demos for p in predictor.predictors()]
+    key_source = json.dumps([name, lm.model, kwargs, demos], sort_keys=True, default=str)
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+
+def _step_cached(name: str, predictor, kwargs: dict) -> bool:
+    # Whether _cached_acall would answer from a cache tier; fresh runs never do
+    if dspy.settings.get("fresh"):
+        return False
+    key = _step_cache_key(name, predictor, kwargs)
+    with _MEMORY_CACHE_LOCK:
+        if key in _MEMORY_CACHE:
+            return True
+    return key in _RESULT_CACHE
+
+
+async def _cached_acall(name: str, predictor, **kwargs):
+    key = _step_cache_key(name, predictor, kwargs)
+    # Fresh runs skip the lookup but still store their results for later runs
+    cached = None
+    if not dspy.settings.get("fresh"):
+        with _MEMORY_CACHE_LOCK:
+            cached = _MEMORY_CACHE.get(key)
+        if cached is None:
+            cached = _RESULT_CACHE.get(key)
+    if cached is not None:
+        with _MEMORY_CACHE_LOCK:
+            _MEMORY_CACHE[key] = cached
+        return dspy.Prediction(**cached)
+
+    result = await predictor.acall(**kwargs)
+    with _MEMORY_CACHE_LOCK:
+        _MEMORY_CACHE[key] = result.toDict()
+    _RESULT_CACHE.set(key, result.toDict())
+    return result
+
+
+def _truncate_tokens(text: str, budget: int = PAYLOAD_TOKEN_BUDGET) -> str:
+    # Keep the head and tail of a long payload, cut on token boundaries. Only a window at
+    # each end is tokenized, since a payload can hold hundreds of KB of base64.
+    half = budget // 2
+    window = half * 16
+    if len(text) <= 2 * window:
+        tokens = litellm.encode(model=lm.model, text=text)
+        if len(tokens) <= budget:
+            return text
+        head, tail = tokens[:half], tokens[-half:]
+    else:
+        head = litellm.encode(model=lm.model, text=text[:window])[:half]
+        tail = litellm.encode(model=lm.model, text=text[-window:])[-half:]
+    return litellm.decode(model=lm.model, tokens=head) + litellm.decode(model=lm.model, tokens=tail)
+
+
+_COMPRESSOR_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _load_compressor():
+    # Loaded on first use; the BERT model takes a few seconds to load, so only once per process
+    if not PAYLOAD_COMPRESSION or PAYLOAD_COMPRESSION_RATE >= 1 or importlib.util.find_spec("llmlingua") is None:
+        return None
+    from llmlingua import PromptCompressor
+    return PromptCompressor(model_name=_LLMLINGUA_MODEL, use_llmlingua2=True, device_map="cpu")
+
+
+def _get_compressor():
+    # Payloads of concurrent tasks are compressed in worker threads; the lock keeps their
+    # first calls from loading the model twice
+    with _COMPRESSOR_LOCK:
+        return _load_compressor()
+
+
+def _compress_payload(text: str) -> str:
+    # Drop low-information tokens (base64 runs, repeated keys) from a payload excerpt.
+    # Results are cached on the text hash, so a re-run skips the model.
+    compressor = _get_compressor()
+    if compressor is None or not text:
+        return text
+    key = "compressed_payload:" + hashlib.sha256(f"{PAYLOAD_COMPRESSION_RATE}:{text}".encode("utf-8")).hexdigest()
+    compressed = _RESULT_CACHE.get(key)
+    if compressed is None:
+        try:
+            compressed = compressor.compress_prompt(
+                text, rate=PAYLOAD_COMPRESSION_RATE, force_tokens=_PAYLOAD_FORCE_TOKENS
+            )["compressed_prompt"]
+        except Exception as e:
+            log.warning("Payload compression failed: %s. Using the uncompressed payload.", e)
+            return text
+        _RESULT_CACHE.set(key, compressed)
+    return compressed
+
+
+def _schema_signature(value):
+    # Structure of a value with the concrete values replaced by their type names
+    if isinstance(value, dict):
+        return {str(k): _schema_signature(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_schema_signature(value[0])] if value else []
+    return type(value).__name__
+
+
+async def _embed_texts(texts: list):
+    # Unit-length embeddings, one row per text, from a single embedding request
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
-    except UnicodeDecodeError:
+        # dspy.Embedder returns a bare vector for a single string input; keep it one row per text
+        embeddings = np.atleast_2d(np.asarray(await embedder.acall(texts), dtype=np.float32))
+    except Exception as e:
+        log.warning("Embedding failed: %s. Skipping the semantic cache.", e)
+        return None
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+async def _embed_task(task_data: dict):
+    # Embed the task with model_information reduced to its shape, so tasks built from the
+    # same template with different URLs or labels land next to each other
+    normalized = dict(task_data, model_information=_schema_signature(task_data.get("model_information", {})))
+    embeddings = await _embed_texts([json.dumps(normalized, sort_keys=True, default=str)])
+    return None if embeddings is None else embeddings[0]
+
+
+def _semantic_lookup(embedding, index_key: str = _SEMANTIC_INDEX_KEY, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+    index = _RESULT_CACHE.get(index_key)
+    if embedding is None or index is None:
+        return None
+    matrix, values = index
+    scores = matrix @ embedding
+    best = int(np.argmax(scores))
+    return values[best] if scores[best] >= threshold else None
+
+
+def _semantic_insert(embedding, value, index_key: str = _SEMANTIC_INDEX_KEY):
+    if embedding is None:
+        return
+    with _RESULT_CACHE.transact():
+        index = _RESULT_CACHE.get(index_key)
+        if index is None:
+            index = (embedding[np.newaxis, :], [value])
+        else:
+            index = (np.vstack([index[0], embedding]), index[1] + [value])
+        _RESULT_CACHE.set(index_key, index)
+
+
+def _normalize_task_text(text: str) -> str:
+    # Whitespace-only edits to task.yaml keep the same cache keys and byte-identical prompts
+    return _TRAILING_WS_RE.sub("", text).strip()
+
+
+@functools.lru_cache(maxsize=256)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    # Keyed on mtime and size so an unchanged file is hashed only once per process
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _ui_cache_key(task_name: str, task_yaml_content: str) -> str:
+    # Final HTML depends on task.yaml, the curl/response sidecars and the compiled program.
+    # The sidecars are hashed by content: the pipeline rewrites them on every run, so their
+    # mtimes change even when the bytes do not
+    sidecars = []
+    for path in (
+        os.path.join(PROBLEMS_DIR, task_name, "curl_command_generated.txt"),
+        os.path.join(PROBLEMS_DIR, task_name, "response.json"),
+        COMPILED_PROGRAM_PATH,
+    ):
         try:
-            with open(file_path, "rb") as f:
-                raw_data = f.read()
-                detected = chardet.detect(raw_data)
-                encoding = detected["encoding"] or "latin-1"
-            
-            with open(file_path, "r", encoding=encoding) as f:
-                return f.read()
-        except (UnicodeDecodeError, LookupError):
-            with open(file_path, "r", encoding="latin-1") as f:
-                return f.read()
+            st = os.stat(path)
+            sidecars.append(_file_digest(path, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            sidecars.append(None)
+    key_source = json.dumps(["ui_html", lm.model, task_name, sidecars]) + task_yaml_content
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+
+class _TagBalance(HTMLParser):
+    # Counts opening and closing tags of the page skeleton
+    TAGS = ("html", "head", "body", "script")
+
+    def __init__(self):
+        super().__init__()
+        self.opened = dict.fromkeys(self.TAGS, 0)
+        self.closed = dict.fromkeys(self.TAGS, 0)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.opened:
+            self.opened[tag] += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.closed:
+            self.closed[tag] += 1
+
+
+def _local_html_ok(html: str, input_payload: str, output_payload: str) -> bool:
+    # Cheap stand-in for the validation LM call: every JSON key in the payloads appears in
+    # the page, and the html/head/body/script tags are present and balanced. Only keys count;
+    # string values such as a predicted label are data the page shows at runtime.
+    lowered = html.lower()
+    fields = set(_PAYLOAD_KEY_RE.findall(input_payload)) | set(_PAYLOAD_KEY_RE.findall(output_payload))
+    if any(field.lower() not in lowered for field in fields):
+        return False
+
+    checker = _TagBalance()
+    try:
+        checker.feed(html)
+        checker.close()
+    except Exception:
+        return False
+    return (
+        checker.opened["html"] == 1 and checker.opened["body"] == 1
+        and checker.opened == checker.closed
+    )
+
+
+def safe_read_file_head_tail(file_path: str, head: int = PAYLOAD_READ_WINDOW, tail: int = PAYLOAD_READ_WINDOW) -> str:
+    # Read only both ends of a large file, skipping the interior; callers that just need an
+    # excerpt of a multi-MB response.json then do O(head + tail) I/O
+    try:
+        f = open(file_path, "rb")
     except FileNotFoundError:
         raise FileNotFoundError(f"File not found: {file_path}")
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= head + tail:
+            return _decode_bytes(f.read())
+        head_bytes = f.read(head)
+        f.seek(size - tail)
+        tail_bytes = f.read()
+
+    # The cuts can split a UTF-8 character: the incremental decoder holds back a partial
+    # one at the end of the head, and continuation bytes opening the tail are dropped
+    try:
+        text = (
+            codecs.getincrementaldecoder("utf-8-sig")().decode(head_bytes)
+            + tail_bytes.lstrip(_UTF8_CONTINUATION_BYTES).decode("utf-8")
+        )
+    except UnicodeDecodeError:
+        return _decode_bytes(head_bytes) + _decode_bytes(tail_bytes)
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _load_task(task_yaml_path: str, task_yaml_content: str) -> dict:
+    # Parsed task.yaml is kept in a task.yaml.cache.json sidecar; orjson loads it far faster
+    # than YAML parses, and YAML is only parsed again once task.yaml is newer than the sidecar
+    cache_path = task_yaml_path + ".cache.json"
+    try:
+        if os.stat(cache_path).st_mtime_ns >= os.stat(task_yaml_path).st_mtime_ns:
+            with open(cache_path, "rb") as f:
+                return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        pass
+
+    try:
+        task_data = yaml.load(task_yaml_content, Loader=_YAML_LOADER)
+    except yaml.YAMLError as e:
+        raise ValueError(f"Invalid YAML content in {task_yaml_path}: {e}")
+
+    try:
+        serialized = orjson.dumps(task_data, option=orjson.OPT_NON_STR_KEYS, default=str)
+    except TypeError:
+        return task_data
+
+    # Written to a temp file and renamed, so a concurrent run never reads a partial sidecar.
+    # Best effort: a read-only problems dir just means parsing YAML every time.
+    try:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(serialized)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    # Returned in its JSON form, so this run sees the same data (string keys) as sidecar hits
+    return orjson.loads(serialized)
+
+
+def _canonical_task_yaml(task_data: dict, task_yaml_content: str) -> str:
+    # task.yaml re-emitted with sorted keys in block style, so reformatting or reordering the
+    # file yields the same analysis prompt and step-cache key
+    try:
+        return yaml.dump(task_data, Dumper=_YAML_DUMPER, sort_keys=True, default_flow_style=False, allow_unicode=True)
+    except (TypeError, yaml.YAMLError):
+        # Mixed key types cannot be sorted, and non-plain values cannot be safely dumped
+        return task_yaml_content
+
+
+async def safe_read_file_async(file_path: str) -> str:
+    # Non-blocking variant for use inside coroutines
+    return await asyncio.to_thread(safe_read_file, file_path)
 
 
 class TaskAnalysis(dspy.Signature):
@@ -51,14 +394,31 @@ class UIComponentGeneration(dspy.Signature):
     For file inputs, ensure the 'accept' attribute is correctly set based on input_type.
     For output components, ensure they are designed to display response from the model server.
     """
+    # Fields shared by every component of a task come first, so the concurrent
+    # component prompts share one long prefix for provider-side prompt caching
     task_type: str = dspy.InputField()
+    model_info: str = dspy.InputField(desc="Model API specifications")
+    input_type: str = dspy.InputField(desc="Primary input data modality")
+    output_type: str = dspy.InputField(desc="Primary output data modality")
+    visualization: str = dspy.InputField(desc="Visualization requirements")
     component_type: str = dspy.InputField(desc="Component type")
     requirements: str = dspy.InputField(desc="Requirements for this component")
+    component_code: str = dspy.OutputField(desc="HTML/JS code for the component")
+
+class BatchUIComponentGeneration(dspy.Signature):
+    """Generate several UI components with Tailwind styling in one pass.
+    Each entry of component_specs has an id, a component_type and its requirements.
+    Return one HTML/JS snippet per spec, keyed by the spec id.
+    For file inputs, ensure the 'accept' attribute is correctly set based on input_type.
+    For output components, ensure they are designed to display response from the model server.
+    """
+    task_type: str = dspy.InputField()
     model_info: str = dspy.InputField(desc="Model API specifications")
     input_type: str = dspy.InputField(desc="Primary input data modality")
     output_type: str = dspy.InputField(desc="Primary output data modality")
     visualization: str = dspy.InputField(desc="Visualization requirements")
-    component_code: str = dspy.OutputField(desc="HTML/JS code for the component")
+    component_specs: list[dict] = dspy.InputField(desc="Components to generate: id, component_type, requirements")
+    components: dict[str, str] = dspy.OutputField(desc="HTML/JS code for each component, keyed by spec id")
 
 class APIIntegration(dspy.Signature):
     """Generate frontend API integration code to communicate directly with model server.
@@ -80,16 +440,17 @@ class APIIntegration(dspy.Signature):
       2. Map numeric labels to human-readable names
       3. Display mapped labels in the UI
     """
-    input_components: str = dspy.InputField(desc="Comma-separated list of input component types.")
-    output_components: str = dspy.InputField(desc="Comma-separated list of output component types.")
-    input_payload: str = dspy.InputField(desc="Expected input payload structure for model server")
-    output_payload: str = dspy.InputField(desc="Expected output payload structure from model server")
+    # Task-level fields first, payload-dependent fields last, for a stable cacheable prefix
     task_type: str = dspy.InputField()
     model_info: str = dspy.InputField(desc="Model API specifications including api_url")
     input_type: str = dspy.InputField(desc="Primary input modality (audio, image, text, tabular).")
     output_type: str = dspy.InputField(desc="Primary output modality (image, text).")
     visualization: str = dspy.InputField(desc="Visualization requirements")
     guidance: str = dspy.InputField(desc="Additional guidance for the API integration", default="")
+    input_components: str = dspy.InputField(desc="Comma-separated list of input component types.")
+    output_components: str = dspy.InputField(desc="Comma-separated list of output component types.")
+    input_payload: str = dspy.InputField(desc="Expected input payload structure for model server")
+    output_payload: str = dspy.InputField(desc="Expected output payload structure from model server")
     integration_code: str = dspy.OutputField(desc="Complete JavaScript code block")
 
 class UILayoutGeneration(dspy.Signature):
@@ -116,100 +477,270 @@ class HTMLValidation(dspy.Signature):
     optimized_html: str = dspy.OutputField(desc="Fixed HTML with: 1. Removed redundant components 2. Added missing fields 3. Syntax corrections")
 
 class UIGenerator(dspy.Module):
-    def __init__(self):
+    def __init__(self, enable_cot: bool = False):
         super().__init__()
-        self.analyze_task = dspy.ChainOfThought(TaskAnalysis)
-        self.generate_component = dspy.ChainOfThought(UIComponentGeneration)
-        self.generate_api_integration = dspy.ChainOfThought(APIIntegration)
-        self.generate_layout = dspy.ChainOfThought(UILayoutGeneration)
-        self.html_validation = dspy.ChainOfThought(HTMLValidation)
-
-    def forward(self, task_yaml_path: str):
-        task_yaml_content = safe_read_file(task_yaml_path)
-        
+        # Analysis and validation are multi-step and keep their reasoning. Components, integration
+        # code and layout are template assembly, so skipping the reasoning field saves output
+        # tokens; enable_cot brings it back for quality comparisons.
+        generation = dspy.ChainOfThought if enable_cot else dspy.Predict
+        # Output caps sized to each step; only the full-page steps get the long budget
+        self.analyze_task = dspy.ChainOfThought(TaskAnalysis, max_tokens=1024)
+        self.generate_component = generation(UIComponentGeneration, max_tokens=4096)
+        self.generate_components = generation(BatchUIComponentGeneration, max_tokens=8192)
+        self.generate_api_integration = generation(APIIntegration, max_tokens=8192)
+        self.generate_layout = generation(UILayoutGeneration, max_tokens=16384, **DETERMINISTIC_CONFIG)
+        self.html_validation = dspy.ChainOfThought(HTMLValidation, max_tokens=16384, **DETERMINISTIC_CONFIG)
+
+    async def _analyze(self, task_yaml_content: str, task_data: dict):
+        # Exact cache first, then the analysis of a near-identical task, and only then the LM
+        kwargs = dict(task_yaml_content=task_yaml_content)
+        if dspy.settings.get("fresh") or _step_cached("analyze_task", self.analyze_task, kwargs):
+            return await _cached_acall("analyze_task", self.analyze_task, **kwargs)
+
+        embedding = await _embed_task(task_data)
+        similar = _semantic_lookup(embedding)
+        if similar is not None:
+            log.info("♻️ Reusing the analysis of a structurally similar task")
+            return dspy.Prediction(**similar)
+
+        analysis = await _cached_acall("analyze_task", self.analyze_task, **kwargs)
+        _semantic_insert(embedding, analysis.toDict())
+        return analysis
+
+    def forward(self, task_yaml_path: str, task_yaml_content: str = None, task_data: dict = None):
         try:
-            task_data = yaml.safe_load(task_yaml_content)
-        except yaml.YAMLError as e:
-            raise ValueError(f"Invalid YAML content in {task_yaml_path}: {e}")
-        
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.aforward(task_yaml_path, task_yaml_content, task_data))
+
+        # A loop already runs in this thread (Jupyter, an async web handler), so asyncio.run
+        # would raise; run aforward on its own loop in a worker thread instead. DSPy context
+        # overrides are per thread, so this thread's are carried over.
+        overrides = dict(getattr(thread_local_overrides, "overrides", {}))
+
+        def _run():
+            with dspy.context(**overrides):
+                return asyncio.run(self.aforward(task_yaml_path, task_yaml_content, task_data))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(_run).result()
+
+    async def aforward(self, task_yaml_path: str, task_yaml_content: str = None, task_data: dict = None):
+        # DNS/TLS to the API host overlaps the file reads and parsing. Batch-mode requests go
+        # through the Batch API instead, so there is nothing to warm for them.
+        warmup_task = None
+        if not isinstance(dspy.settings.lm, BatchLM):
+            warmup_task = asyncio.create_task(warm_connection())
+        try:
+            return await self._agenerate(task_yaml_path, task_yaml_content, task_data)
+        finally:
+            # Never left pending past this call; by now the LM requests have opened the pool anyway
+            if warmup_task is not None and not warmup_task.done():
+                warmup_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await warmup_task
+
+    async def _agenerate(self, task_yaml_path: str, task_yaml_content: str = None, task_data: dict = None):
         # Extract task name from the path
         task_dir = os.path.dirname(task_yaml_path)
         task_name = os.path.basename(task_dir)
+        task_data_dir = os.path.join(PROBLEMS_DIR, task_name)
+
+        async def _read_payloads():
+            try:
+                return await asyncio.gather(
+                    asyncio.to_thread(safe_read_file_head_tail, os.path.join(task_data_dir, "curl_command_generated.txt")),
+                    asyncio.to_thread(safe_read_file_head_tail, os.path.join(task_data_dir, "response.json")),
+                )
+            except FileNotFoundError as e:
+                return e
+
+        # The sidecar payloads are independent of task.yaml, so read them alongside it and the analysis
+        payloads_task = asyncio.create_task(_read_payloads())
+
+        # Callers that already read or parsed task.yaml can pass it in to skip doing it again
+        if task_yaml_content is None:
+            task_yaml_content = await safe_read_file_async(task_yaml_path)
+        
+        if task_data is None and task_yaml_path.endswith(".json"):
+            # JSON task files skip the YAML loader entirely
+            try:
+                task_data = orjson.loads(task_yaml_content)
+            except orjson.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON content in {task_yaml_path}: {e}")
+        elif task_data is None:
+            task_data = _load_task(task_yaml_path, task_yaml_content)
         
         model_info = task_data.get("model_information", {})
         visualization = task_data.get("visualize", {})
         guidance = task_data.get("model_information", {}).get("output_format", {}).get("guidance", "")
-        print("guidance", guidance)
+        # Serialized once, in a canonical sorted form, and shared by every LM call below so the
+        # prompt bytes stay identical across calls and runs
+        # (YAML id2label/label2id maps can have int keys, hence OPT_NON_STR_KEYS)
+        json_options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        model_info_str = orjson.dumps(model_info, option=json_options).decode()
+        visualization_str = orjson.dumps(visualization, option=json_options).decode()
+        log.debug("guidance: %s", guidance)
 
         # Step 1: Analyze task requirements
-        analysis = self.analyze_task(task_yaml_content=task_yaml_content)
+        analysis = await self._analyze(_canonical_task_yaml(task_data, _normalize_task_text(task_yaml_content)), task_data)
         
         # Parse component lists
         input_comp_list = [c.strip() for c in analysis.input_components.split(",")]
         output_comp_list = [c.strip() for c in analysis.output_components.split(",")]
 
-        # Get base directory
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        task_data_dir = os.path.join(base_dir, "problems", task_name)
-    
-        try:
-            input_payload = safe_read_file(os.path.join(task_data_dir, "curl_command_generated.txt"))
-            output_payload = safe_read_file(os.path.join(task_data_dir, "response.json"))
-            print("Successfully loaded curl_command_generated.txt and response.json")
-        except FileNotFoundError as e:
-            print(f"Warning: {e}. Using payload from analysis.")
+        payloads = await payloads_task
+        if not isinstance(payloads, FileNotFoundError):
+            input_payload, output_payload = payloads
+            log.debug("Loaded curl_command_generated.txt and response.json")
+        else:
+            log.warning("%s. Using payload from analysis.", payloads)
             input_payload = analysis.input_payload
             output_payload = analysis.output_payload
 
-        if len(input_payload) >= 2000:
-            input_payload = input_payload[:1000] + input_payload[-1000:]
-        if len(output_payload) >= 2000:
-            output_payload = output_payload[:1000] + output_payload[-1000:]
+        # Trimmed once here; the same excerpts feed every call below
+        input_payload = _truncate_tokens(input_payload)
+        output_payload = _truncate_tokens(output_payload)
+        # The uncompressed excerpts are kept for the local key check, which must see every field
+        raw_input_payload, raw_output_payload = input_payload, output_payload
+        # Then compressed when enabled (CPU-bound model inference, so off the event loop)
+        input_payload, output_payload = await asyncio.gather(
+            asyncio.to_thread(_compress_payload, input_payload),
+            asyncio.to_thread(_compress_payload, output_payload),
+        )
+
+        # The integration and component prompts open with the same task-level fields; one routing
+        # key per task type sends them to the same OpenAI prompt-cache shard
+        cache_routing = dict(config=dict(extra_body={"prompt_cache_key": f"ui-{analysis.task_type}"}))
 
+        # Steps 2-4 only depend on the analysis, so run them concurrently
         # Step 2: Generate API integration (frontend -> model server)
-        api_integration = self.generate_api_integration(
+        api_integration_call = _cached_acall(
+                "generate_api_integration",
+                self.generate_api_integration,
                 task_type=analysis.task_type,
                 input_components=analysis.input_components,
                 output_components=analysis.output_components,
                 input_payload=input_payload,
                 output_payload=output_payload,
-                model_info=json.dumps(model_info),
+                model_info=model_info_str,
                 input_type=analysis.input_type,
                 output_type=analysis.output_type,
-                visualization=json.dumps(visualization),
-                guidance=guidance
+                visualization=visualization_str,
+                guidance=guidance,
+                **cache_routing
             )
 
-        # Step 3: Generate input components
-        input_components_html = []
-        for comp_type in input_comp_list:
-            comp = self.generate_component( 
-                task_type=analysis.task_type,
-                component_type=comp_type,
-                requirements=f"Generate an input component of type \'{comp_type}\' for a \'{analysis.task_type}\' task. Ensure the 'accept' attribute is correctly set for file inputs based on the input type: {analysis.input_type}.",
-                model_info=json.dumps(model_info),
-                input_type=analysis.input_type,
-                output_type=analysis.output_type,
-                visualization=json.dumps(visualization)
-            )
-            input_components_html.append(comp.component_code)
-        
-        # Step 4: Generate output components
-        output_components_html = []
-        for comp_type in output_comp_list:
-            comp = self.generate_component(
-                task_type=analysis.task_type,
-                component_type=comp_type,
-                requirements=f"Generate an output component of type \'{comp_type}\' for a \'{analysis.task_type}\' task. Ensure it is designed to display labels, scores, and emojis if the output type is \'{analysis.output_type}\' and the task requires it.",
-                model_info=json.dumps(model_info),
-                input_type=analysis.input_type,
-                output_type=analysis.output_type,
-                visualization=json.dumps(visualization)
-            )
-            output_components_html.append(comp.component_code)
+        # Steps 3-4: Generate input and output components in one batched LM call.
+        # A component type repeated within a role is generated once and reused.
+        input_ids = {comp_type: f"input_{i}" for i, comp_type in enumerate(dict.fromkeys(input_comp_list))}
+        output_ids = {comp_type: f"output_{i}" for i, comp_type in enumerate(dict.fromkeys(output_comp_list))}
+        component_specs = [
+            {
+                "id": spec_id,
+                "component_type": comp_type,
+                "requirements": f"Generate an input component of type \'{comp_type}\' for a \'{analysis.task_type}\' task. Ensure the 'accept' attribute is correctly set for file inputs based on the input type: {analysis.input_type}.",
+            }
+            for comp_type, spec_id in input_ids.items()
+        ] + [
+            {
+                "id": spec_id,
+                "component_type": comp_type,
+                "requirements": f"Generate an output component of type \'{comp_type}\' for a \'{analysis.task_type}\' task. Ensure it is designed to display labels, scores, and emojis if the output type is \'{analysis.output_type}\' and the task requires it.",
+            }
+            for comp_type, spec_id in output_ids.items()
+        ]
+        shared_inputs = dict(
+            task_type=analysis.task_type,
+            model_info=model_info_str,
+            input_type=analysis.input_type,
+            output_type=analysis.output_type,
+            visualization=visualization_str,
+            **cache_routing
+        )
+
+        # Bound the fan-out so tasks with many components stay under the rate limit
+        sem = asyncio.Semaphore(LM_CONCURRENCY)
+
+        async def _limited(call):
+            async with sem:
+                return await call
+
+        component_index_key = _COMPONENT_INDEX_PREFIX + analysis.task_type
+
+        async def _similar_components():
+            # Specs close enough to a component generated for an earlier task of the same type
+            # reuse its snippet. Skipped when the exact batch is cached or the run is fresh.
+            batch_kwargs = dict(component_specs=component_specs, **shared_inputs)
+            if dspy.settings.get("fresh") or _step_cached("generate_components", self.generate_components, batch_kwargs):
+                return {}, None
+            schema = _schema_signature(model_info)
+            embeddings = await _embed_texts([
+                json.dumps({
+                    "component_type": spec["component_type"],
+                    "requirements": spec["requirements"],
+                    "model_info": schema,
+                    "input_type": analysis.input_type,
+                    "output_type": analysis.output_type,
+                    "visualization": visualization_str,
+                }, sort_keys=True, default=str)
+                for spec in component_specs
+            ])
+            if embeddings is None:
+                return {}, None
+            reused = {}
+            for spec, embedding in zip(component_specs, embeddings):
+                snippet = _semantic_lookup(embedding, component_index_key, COMPONENT_SEMANTIC_THRESHOLD)
+                if snippet is not None:
+                    reused[spec["id"]] = snippet
+            if reused:
+                log.info("♻️ Reusing %d component(s) generated for a similar %s task", len(reused), analysis.task_type)
+            return reused, embeddings
+
+        async def _generate_components():
+            generated, embeddings = await _similar_components()
+            pending = [spec for spec in component_specs if spec["id"] not in generated]
+            if pending:
+                try:
+                    batch = await _limited(_cached_acall(
+                        "generate_components", self.generate_components, component_specs=pending, **shared_inputs
+                    ))
+                    if isinstance(batch.components, dict):
+                        generated.update((spec["id"], batch.components.get(spec["id"])) for spec in pending)
+                except Exception as e:
+                    log.warning("Batched component generation failed: %s. Generating components one by one.", e)
+
+            # Anything the batch left out falls back to its own concurrent per-component call
+            missing = [spec for spec in component_specs if not isinstance(generated.get(spec["id"]), str)]
+            results = await asyncio.gather(*(
+                _limited(_cached_acall(
+                    "generate_component",
+                    self.generate_component,
+                    component_type=spec["component_type"],
+                    requirements=spec["requirements"],
+                    **shared_inputs
+                ))
+                for spec in missing
+            ))
+            for spec, comp in zip(missing, results):
+                generated[spec["id"]] = comp.component_code
+
+            if embeddings is not None:
+                for spec, embedding in zip(component_specs, embeddings):
+                    if spec in pending:
+                        _semantic_insert(embedding, generated[spec["id"]], component_index_key)
+            return generated
+
+        api_integration, generated = await asyncio.gather(
+            _limited(api_integration_call), _generate_components()
+        )
+        input_components_html = [generated[input_ids[comp_type]] for comp_type in input_comp_list]
+        output_components_html = [generated[output_ids[comp_type]] for comp_type in output_comp_list]
         
         # Step 5: Generate complete UI
-        complete_ui = self.generate_layout(
+        complete_ui = await _cached_acall(
+            "generate_layout",
+            self.generate_layout,
             task_name=task_data.get("task_description", {}).get("type", "ML Task"),
             task_description=task_data.get("task_description", {}).get("description", ""),
             input_components=input_components_html,
@@ -217,53 +748,139 @@ class UIGenerator(dspy.Module):
             api_integration=api_integration.integration_code
         )
 
-        final_ui = self.html_validation(
-            html_code=complete_ui.complete_html,
-            input_payload=input_payload,
-            output_payload=output_payload,
-            task_type=analysis.task_type
-        )
+        # Step 6: Validate, unless the page already covers the payload fields and is well-formed
+        if _local_html_ok(complete_ui.complete_html, raw_input_payload, raw_output_payload):
+            ui_html = complete_ui.complete_html
+        else:
+            final_ui = await _cached_acall(
+                "html_validation",
+                self.html_validation,
+                html_code=complete_ui.complete_html,
+                input_payload=input_payload,
+                output_payload=output_payload,
+                task_type=analysis.task_type
+            )
+            ui_html = final_ui.optimized_html
         
         return dspy.Prediction(
-            ui_html=final_ui.optimized_html,
+            ui_html=ui_html,
             analysis=analysis
         )
 
+_UI_GENERATOR_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _load_ui_generator() -> UIGenerator:
+    ui_generator = UIGenerator()
+    if os.path.exists(COMPILED_PROGRAM_PATH):
+        ui_generator.load(COMPILED_PROGRAM_PATH)
+    return ui_generator
+
+
+def get_ui_generator() -> UIGenerator:
+    # One UIGenerator per process, shared by every AutoUIGenerator; the lock keeps concurrent
+    # first calls from a threaded server from building it twice
+    with _UI_GENERATOR_LOCK:
+        return _load_ui_generator()
+
+
 class AutoUIGenerator:
-    def __init__(self):
-        self.ui_generator = UIGenerator()
-    
-    def generate(self, task_problem_dir: str) -> str:
+    def __init__(self, max_parallel: int = 4):
+        self.ui_generator = get_ui_generator()
+        # Tasks generated at once by agenerate_many; each task also fans out up to LM_CONCURRENCY calls
+        self.max_parallel = max_parallel
+
+    def _read_task(self, task_problem_dir: str, fresh: bool):
         task_yaml_path = os.path.join(task_problem_dir, "task.yaml")
-        if not os.path.exists(task_yaml_path):
+        try:
+            task_yaml_content = safe_read_file(task_yaml_path)
+        except FileNotFoundError:
             raise FileNotFoundError(f"task.yaml not found in {task_problem_dir}")
         
-        result = self.ui_generator(task_yaml_path=task_yaml_path)
+        # An unchanged task reuses its last generated UI without any parsing or LM work. Only the
+        # key is whitespace-normalized; the raw text is what gets parsed, so block scalars keep
+        # their trailing spaces and blank lines
+        cache_key = _ui_cache_key(
+            os.path.basename(os.path.dirname(task_yaml_path)), _normalize_task_text(task_yaml_content)
+        )
+        cached = None if fresh else _RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            log.info("♻️ Reusing UI generated for unchanged task inputs")
+        return task_yaml_path, task_yaml_content, cache_key, cached
+
+    @staticmethod
+    def _run_lm(batch_mode: bool, fresh: bool):
+        # Offline runs: every LM call goes through OpenAI's Batch API at half the cost
+        run_lm = get_batch_lm() if batch_mode else lm
+        if fresh:
+            # Bypass DSPy's LM cache and our step caches for this run only
+            run_lm = run_lm.copy(cache=False)
+        return run_lm
+    
+    def generate(self, task_problem_dir: str, batch_mode: bool = False, fresh: bool = False) -> str:
+        task_yaml_path, task_yaml_content, cache_key, cached = self._read_task(task_problem_dir, fresh)
+        if cached is not None:
+            return cached
+
+        with dspy.context(lm=self._run_lm(batch_mode, fresh), fresh=fresh):
+            result = self.ui_generator(task_yaml_path=task_yaml_path, task_yaml_content=task_yaml_content)
+        _RESULT_CACHE.set(cache_key, result.ui_html)
         return result.ui_html
+
+    async def agenerate_many(self, task_problem_dirs: list, batch_mode: bool = False, fresh: bool = False) -> list:
+        """Generate the UIs of several tasks concurrently on the running event loop.
+
+        Returns one entry per directory, in order: the UI HTML, or the exception that task raised.
+        """
+        sem = asyncio.Semaphore(self.max_parallel)
+
+        async def _generate_one(task_problem_dir):
+            async with sem:
+                task_yaml_path, task_yaml_content, cache_key, cached = await asyncio.to_thread(
+                    self._read_task, task_problem_dir, fresh
+                )
+                if cached is not None:
+                    return cached
+                result = await self.ui_generator.acall(task_yaml_path=task_yaml_path, task_yaml_content=task_yaml_content)
+                _RESULT_CACHE.set(cache_key, result.ui_html)
+                return result.ui_html
+
+        # DSPy context overrides are per thread, not per task, so they are entered once around
+        # the whole fan-out; in batch mode the tasks' LM calls then share batch jobs as well
+        with dspy.context(lm=self._run_lm(batch_mode, fresh), fresh=fresh):
+            return await asyncio.gather(*(_generate_one(d) for d in task_problem_dirs), return_exceptions=True)
     
     def save(self, ui_html: str, output_dir: str, task_name: str):
         os.makedirs(output_dir, exist_ok=True)
         
-        def clean_code(code):
-            match = re.search(r"<html[\s\S]*?</html>", code, re.IGNORECASE)
-            if match:
-                code = match.group(0)
-            else:
-                return ""
-
-            code = re.sub(r"```(html|javascript)?\n|\n```", "", code)
-            code = code.replace(r"\`", "`")
-            code = code.replace(r"\$", "$")
-
-            return code.strip()
+        def iter_clean_code(code):
+            match = _HTML_BLOCK_RE.search(code)
+            if not match:
+                return
+
+            # Drop markdown fences and unescape \` and \$ in a single pass, yielding the kept
+            # segments in order. The span starts with <html and ends with </html>, so there is
+            # no surrounding whitespace left to strip.
+            pos = match.start()
+            for fence in _FENCE_RE.finditer(code, match.start(), match.end()):
+                yield code[pos:fence.start()]
+                yield fence.group(1) or ""
+                pos = fence.end()
+            yield code[pos:match.end()]
         
         ui_path = os.path.join(output_dir, f"{task_name}_ui.html")
-        with open(ui_path, "w", encoding="utf-8-sig") as f:
-            f.write(clean_code(ui_html))
+        # Segments go straight into the file buffer, so no cleaned or encoded copy of the whole page is built
+        with open(ui_path, "wb", buffering=1 << 16) as f:
+            f.write(codecs.BOM_UTF8)
+            for segment in iter_clean_code(ui_html):
+                f.write(segment.encode("utf-8"))
         
         return ui_path
 
 if __name__ == "__main__":
+    # --debug also shows the guidance and payload details logged during generation
+    logging.basicConfig(level=logging.DEBUG if "--debug" in sys.argv else logging.INFO, format="%(message)s")
     generator = AutoUIGenerator()
     task_name = "image_segmentation"
     task_problem_dir = f"problems/{task_name}"
@@ -272,7 +889,7 @@ if __name__ == "__main__":
         print(f"Generating UI for task: {task_name}")
         print(f"Looking for task.yaml in: {task_problem_dir}")
         
-        ui_html = generator.generate(task_problem_dir)
+        ui_html = generator.generate(task_problem_dir, batch_mode="--batch" in sys.argv, fresh="--fresh" in sys.argv)
         ui_path = generator.save(ui_html, task_problem_dir, task_name)
         
         print("Standalone HTML UI generated successfully!")
@@ -1,78 +1,202 @@
 import requests
 import uncurl
 import sys
-import json
+import re
+import orjson
 import os
+import asyncio
+import aiohttp
+import functools
+import importlib.util
+import logging
+import logging.handlers
+from pathlib import Path
+from requests.adapters import HTTPAdapter
 
-def execute_curl_for_task(task_name: str):
-    # Set up paths
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    curl_file_path = os.path.join(base_dir, "problems", task_name, "curl_command_generated.txt")
-    response_file_path = os.path.join(base_dir, "problems", task_name, "response.json")
-    
-    # Read curl command
+log = logging.getLogger(__name__)
+
+PROBLEMS_DIR = Path(__file__).resolve().parent / "problems"
+
+# Shared session so repeated calls to the same model server reuse connections
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+_TIMEOUT = 30
+_WRITE_BUFFER_SIZE = 1 << 17
+_LINE_JOIN_RE = re.compile(r"\\*\s*\n\s*")
+
+def _log_saved(is_json: bool, response_file_path: str):
+    if is_json:
+        log.info("✅ Response saved to %s", response_file_path)
+    else:
+        log.info("✅ Non-JSON response saved to %s", response_file_path)
+
+def _pretty_json(content: bytes):
+    # Indented JSON bytes, or None when the body does not actually parse as JSON
     try:
-        with open(curl_file_path, "r") as file:
-            # Join lines and strip whitespace
-            curl_command = ' '.join(line.strip().rstrip('\\') for line in file if line.strip())
-        if not curl_command:
-            print(f"❌ Error: The file '{curl_file_path}' is empty.")
-            return False
-    except FileNotFoundError:
-        print(f"❌ Error: The file '{curl_file_path}' was not found.")
-        return False
+        return orjson.dumps(orjson.loads(content), option=orjson.OPT_INDENT_2)
+    except orjson.JSONDecodeError:
+        return None
 
-    # Parse using uncurl
+@functools.lru_cache(maxsize=256)
+def _parse_curl(curl_file_path: str, mtime: float):
+    # Cached per file version, so re-executing a task skips the read and uncurl parse
+    # One whole-file read, then a single regex pass joins the lines, dropping line
+    # continuations and surrounding whitespace. Whitespace inside lines is kept as-is
+    # since it may be part of a quoted request body.
+    text = Path(curl_file_path).read_text(encoding="utf-8")
+    curl_command = _LINE_JOIN_RE.sub(" ", text.strip()).rstrip("\\")
+    if not curl_command:
+        return None
+    return uncurl.parse_context(curl_command)
+
+def _load_curl_context(task_name: str):
+    task_dir = PROBLEMS_DIR / task_name
+    curl_file_path = str(task_dir / "curl_command_generated.txt")
+    response_file_path = str(task_dir / "response.json")
+
+    # Read and parse curl command
     try:
-        python_code = uncurl.parse(curl_command)
-    except Exception as e:
-        print(f"❌ Error during cURL conversion: {e}")
-        return False
+        ctx = _parse_curl(curl_file_path, os.stat(curl_file_path).st_mtime)
+    except FileNotFoundError:
+        log.error("❌ Error: The file '%s' was not found.", curl_file_path)
+        return None
+    except (Exception, SystemExit) as e:
+        log.error("❌ Error during cURL conversion: %s", e)
+        return None
+
+    if ctx is None:
+        log.error("❌ Error: The file '%s' is empty.", curl_file_path)
+        return None
+    return ctx, response_file_path
 
-    # Add assignment so we can capture the response
-    python_code_with_assignment = "response = " + python_code
+def execute_curl_for_task(task_name: str, pretty: bool = False):
+    loaded = _load_curl_context(task_name)
+    if loaded is None:
+        return False
+    ctx, response_file_path = loaded
 
-    # Execute in a safe environment
-    local_vars = {}
+    # Send the request
     try:
-        exec(python_code_with_assignment, {"requests": requests}, local_vars)
+        response = _SESSION.request(
+            method=ctx.method,
+            url=ctx.url,
+            headers=dict(ctx.headers),
+            cookies=dict(ctx.cookies),
+            data=ctx.data,
+            auth=ctx.auth or None,
+            verify=not ctx.verify,
+            timeout=_TIMEOUT,
+            stream=True,
+        )
     except Exception as e:
-        print(f"❌ Error executing the generated code: {e}")
+        log.error("❌ Error executing the request: %s", e)
         return False
 
     # Process the response
-    response = local_vars.get("response")
-    if response:
+    with response:
+        if not response:
+            log.error("❌ Error: Request failed with status %s.", response.status_code)
+            return False
+
+        is_json = "json" in response.headers.get("Content-Type", "").lower()
         try:
-            json_response = response.json()
-            with open(response_file_path, "w") as file:
-                file.write(json.dumps(json_response, indent=4, ensure_ascii=False))
-            print(f"✅ Response saved to {response_file_path}")
-            return True
-        except requests.exceptions.JSONDecodeError:
-            # If not JSON, save as text
-            with open(response_file_path, "w") as file:
-                file.write(response.text)
-            print(f"✅ Non-JSON response saved to {response_file_path}")
-            return True
+            # Decide the body before opening the file, so it is opened and written once
+            body = _pretty_json(response.content) if pretty and is_json else None
+            with open(response_file_path, "wb", buffering=_WRITE_BUFFER_SIZE) as file:
+                if body is not None:
+                    file.write(body)
+                else:
+                    # Persist the body as-is, streamed in 64 KiB chunks
+                    for chunk in response.iter_content(chunk_size=1 << 16):
+                        file.write(chunk)
         except Exception as e:
-            print(f"❌ Error processing response: {e}")
+            log.error("❌ Error processing response: %s", e)
             return False
-    else:
-        print("❌ Error: No response object found after execution.")
+
+        _log_saved(is_json, response_file_path)
+        return True
+
+async def _execute_one(session: aiohttp.ClientSession, sem: asyncio.Semaphore, task_name: str, pretty: bool = False):
+    loaded = await asyncio.to_thread(_load_curl_context, task_name)
+    if loaded is None:
         return False
+    ctx, response_file_path = loaded
+
+    try:
+        async with sem, session.request(
+            ctx.method.upper(),
+            ctx.url,
+            headers=dict(ctx.headers),
+            cookies=dict(ctx.cookies),
+            data=ctx.data,
+            auth=aiohttp.BasicAuth(*ctx.auth) if ctx.auth else None,
+            ssl=not ctx.verify,
+        ) as response:
+            if response.status >= 400:
+                log.error("❌ Error: Request failed with status %s.", response.status)
+                return False
+
+            is_json = "json" in response.headers.get("Content-Type", "").lower()
+            body = None
+            if pretty and is_json:
+                content = await response.read()
+                body = _pretty_json(content) or content
+
+            # File writes are blocking, so hand them to a worker thread
+            file = await asyncio.to_thread(open, response_file_path, "wb", _WRITE_BUFFER_SIZE)
+            try:
+                if body is not None:
+                    await asyncio.to_thread(file.write, body)
+                else:
+                    async for chunk in response.content.iter_chunked(1 << 16):
+                        await asyncio.to_thread(file.write, chunk)
+            finally:
+                await asyncio.to_thread(file.close)
+    except Exception as e:
+        log.error("❌ Error executing the request for %s: %s", task_name, e)
+        return False
+
+    _log_saved(is_json, response_file_path)
+    return True
+
+async def execute_curl_for_tasks(task_names, concurrency: int = 16, pretty: bool = False):
+    # Execute the curl commands of several tasks concurrently over one aiohttp session
+    sem = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=32, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        return await asyncio.gather(*(_execute_one(session, sem, task_name, pretty) for task_name in task_names))
 
 if __name__ == "__main__":
+    # Buffer log records and flush them to stderr in batches instead of per message
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[logging.handlers.MemoryHandler(
+            capacity=256, flushLevel=logging.CRITICAL, target=logging.StreamHandler(sys.stderr)
+        )],
+    )
+
     if len(sys.argv) < 2:
-        print("Usage: python agent_execute_curl.py <task_name>")
+        print("Usage: python agent_execute_curl.py <task_name> [<task_name> ...]")
         sys.exit(1)
-    
-    task_name = sys.argv[1]
-    success = execute_curl_for_task(task_name)
-    
-    if success:
-        print(f"✅ Execution completed for task: {task_name}")
-        sys.exit(0)
+
+    task_names = sys.argv[1:]
+    if len(task_names) == 1:
+        results = [execute_curl_for_task(task_names[0])]
     else:
-        print(f"❌ Execution failed for task: {task_name}")
-        sys.exit(1)
\ No newline at end of file
+        # uvloop, when installed, runs the concurrent requests on a faster event loop
+        if importlib.util.find_spec("uvloop") is not None:
+            import uvloop
+            results = uvloop.run(execute_curl_for_tasks(task_names))
+        else:
+            results = asyncio.run(execute_curl_for_tasks(task_names))
+
+    for task_name, success in zip(task_names, results):
+        if success:
+            print(f"✅ Execution completed for task: {task_name}")
+        else:
+            print(f"❌ Execution failed for task: {task_name}")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,70 @@
+import os
+import re
+import sys
+import orjson
+import dspy
+from agent_dspy_v8 import UIGenerator, PROBLEMS_DIR, COMPILED_PROGRAM_PATH, safe_read_file
+
+_HTML_RE = re.compile(r"<html[\s\S]*?</html>", re.IGNORECASE)
+
+
+def payload_keys(task_dir: str) -> list:
+    # Top-level response fields the generated UI is expected to render
+    try:
+        with open(os.path.join(task_dir, "response.json"), "rb") as f:
+            response = orjson.loads(f.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return []
+    return list(response) if isinstance(response, dict) else []
+
+
+def build_trainset() -> list:
+    # Every task under problems/ with a task.yaml is a training example
+    examples = []
+    with os.scandir(PROBLEMS_DIR) as entries:
+        for entry in entries:
+            task_yaml_path = os.path.join(entry.path, "task.yaml")
+            if not entry.is_dir() or not os.path.exists(task_yaml_path):
+                continue
+            examples.append(dspy.Example(
+                task_yaml_path=task_yaml_path,
+                task_yaml_content=safe_read_file(task_yaml_path),
+                payload_keys=payload_keys(entry.path),
+            ).with_inputs("task_yaml_path", "task_yaml_content"))
+    return examples
+
+
+def ui_metric(example, pred, trace=None):
+    # A complete <html> page that mentions the response fields it has to display
+    html = pred.ui_html or ""
+    if not _HTML_RE.search(html):
+        return False if trace is not None else 0.0
+    keys = example.payload_keys
+    score = sum(key in html for key in keys) / len(keys) if keys else 1.0
+    return score >= 0.8 if trace is not None else score
+
+
+def main():
+    trainset = build_trainset()
+    if not trainset:
+        print(f"❌ No tasks with a task.yaml found in {PROBLEMS_DIR}")
+        sys.exit(1)
+    print(f"📚 Compiling UIGenerator on {len(trainset)} tasks")
+
+    teleprompter = dspy.BootstrapFewShotWithRandomSearch(
+        metric=ui_metric,
+        max_bootstrapped_demos=3,
+        max_labeled_demos=3,
+        num_candidate_programs=10,
+        num_threads=8,
+    )
+    # Fresh, so every predictor actually runs and is traced instead of coming from the step caches
+    with dspy.context(fresh=True):
+        compiled = teleprompter.compile(UIGenerator(), trainset=trainset)
+
+    compiled.save(COMPILED_PROGRAM_PATH)
+    print(f"✅ Compiled UIGenerator saved to {COMPILED_PROGRAM_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import os
+import mmap
+import functools
+from charset_normalizer import from_bytes
+
+# Files at least this large are decoded straight from a memory map instead of a read() copy
+MMAP_THRESHOLD = 1 << 16
+
+
+def _decode_bytes(raw_data) -> str:
+    # raw_data is bytes or any buffer, such as an mmap
+    def decode(encoding):
+        # Match text-mode reads, which translate \r\n and \r to \n
+        return str(raw_data, encoding).replace("\r\n", "\n").replace("\r", "\n")
+
+    try:
+        return decode("utf-8-sig")
+    except UnicodeDecodeError:
+        pass
+
+    # Only detect on a 64 KiB sample; charset_normalizer is much faster than chardet
+    best = from_bytes(raw_data[:1 << 16]).best()
+    try:
+        return decode(best.encoding if best else "latin-1")
+    except (UnicodeDecodeError, LookupError):
+        return decode("latin-1")
+
+
+@functools.lru_cache(maxsize=64)
+def _read_decoded(file_path: str, mtime_ns: int) -> str:
+    # Keyed on mtime so an edited file is decoded again
+    with open(file_path, "rb") as f:
+        # Small files (and empty ones, which cannot be mapped) take one plain read
+        if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+            return _decode_bytes(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _decode_bytes(mapped)
+
+
+def safe_read_file(file_path: str) -> str:
+    try:
+        mtime_ns = os.stat(file_path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"File not found: {file_path}")
+    return _read_decoded(file_path, mtime_ns)
@@ -0,0 +1,186 @@
+import os
+import json
+import asyncio
+import logging
+import functools
+import random
+import threading
+import weakref
+import importlib.util
+import dspy
+import httpx
+import litellm
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# Keep DSPy's LM response cache on disk so it survives across runs; DSPY_CACHEDIR lets
+# CI and dev machines point at a shared directory
+dspy.configure_cache(
+    enable_disk_cache=True,
+    enable_memory_cache=True,
+    disk_cache_dir=os.getenv("DSPY_CACHEDIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "dspy")),
+)
+
+def _new_async_client() -> httpx.AsyncClient:
+    # HTTP/2 needs the optional h2 package
+    return httpx.AsyncClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=60.0,
+        limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=60),
+    )
+
+# httpx connection pools are bound to the event loop they first ran on, so each loop (every
+# asyncio.run, every worker thread running one) gets its own client. Entries go away with their loop.
+_LOOP_CLIENTS = weakref.WeakKeyDictionary()
+_LOOP_CLIENTS_LOCK = threading.Lock()
+
+def get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    with _LOOP_CLIENTS_LOCK:
+        client = _LOOP_CLIENTS.get(loop)
+        if client is None:
+            client = _LOOP_CLIENTS[loop] = _new_async_client()
+    return client
+
+class _LoopLocalAsyncClient(httpx.AsyncClient):
+    """Session handed to litellm that sends each request through the running loop's client."""
+
+    async def send(self, request, **kwargs):
+        return await get_async_client().send(request, **kwargs)
+
+# One keep-alive connection pool per event loop for every async LM request, so calls within a
+# run reuse connections instead of repeating the TCP/TLS handshake
+litellm.aclient_session = _LoopLocalAsyncClient(timeout=60.0)
+
+# Loops whose client has already been warmed; entries go away with their loop
+_WARMED_LOOPS = weakref.WeakSet()
+
+async def warm_connection():
+    # Open a pooled connection to the API host ahead of the first LM call. GET /models costs
+    # no tokens; it only pays for DNS, TCP and TLS so the first real request finds a warm
+    # keep-alive connection. Best effort: the real call reports any connection problem.
+    # Runs once per loop, since every task on a loop shares that loop's pool.
+    loop = asyncio.get_running_loop()
+    with _LOOP_CLIENTS_LOCK:
+        if loop in _WARMED_LOOPS:
+            return
+        _WARMED_LOOPS.add(loop)
+    base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+    try:
+        await get_async_client().get(
+            f"{base_url}/models", headers={"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}"}
+        )
+    except Exception:
+        pass
+
+# One LM shared by every agent module, so the client, connection pool and cache are set up once
+lm = dspy.LM(
+    "openai/gpt-4.1-nano",
+    api_key=os.getenv("OPENAI_API_KEY"),
+    cache=True,
+    cache_in_memory=True,
+    num_retries=2,
+    # Default output cap for short calls; predictors that emit whole pages raise it per call
+    max_tokens=2048,
+)
+dspy.configure(lm=lm)
+
+# Shared embedder for similarity lookups; its results go through the same DSPy cache
+embedder = dspy.Embedder("openai/text-embedding-3-small", api_key=os.getenv("OPENAI_API_KEY"))
+
+
+class BatchLM(dspy.LM):
+    """dspy.LM that sends async chat requests through OpenAI's Batch API.
+
+    Requests arriving within `window` seconds of each other go out as one batch job,
+    which is polled with jittered exponential backoff (capped at `poll_interval`)
+    until it finishes. Batch jobs cost half as much but can take
+    minutes to hours, so this is only meant for offline bulk runs.
+    """
+
+    def __init__(self, model: str, window: float = 2.0, poll_interval: float = 30.0, **kwargs):
+        super().__init__(model, **kwargs)
+        self.window = window
+        self.poll_interval = poll_interval
+        self._pending = []
+        self._flush_task = None
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        kwargs.pop("cache", None)
+        kwargs.pop("cache_in_memory", None)
+        messages = messages or [{"role": "user", "content": prompt}]
+        body = {
+            "model": self.model.split("/", 1)[-1],
+            "messages": messages,
+            **{k: v for k, v in {**self.kwargs, **kwargs}.items() if not k.startswith("api_")},
+        }
+        # litellm passes extra_body fields through to the API; the batch body takes them inline
+        body.update(body.pop("extra_body", None) or {})
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((body, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self):
+        # Give concurrent callers a moment to queue up, then submit them all together
+        await asyncio.sleep(self.window)
+        pending, self._pending, self._flush_task = self._pending, [], None
+        try:
+            results = await self._run_batch([body for body, _ in pending])
+        except Exception as e:
+            results = [e] * len(pending)
+
+        for (_, future), result in zip(pending, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _run_batch(self, bodies: list) -> list:
+        client = openai.AsyncOpenAI(api_key=self.kwargs.get("api_key"))
+        lines = "\n".join(
+            json.dumps({"custom_id": str(i), "method": "POST", "url": "/v1/chat/completions", "body": body})
+            for i, body in enumerate(bodies)
+        )
+        batch_file = await client.files.create(file=("requests.jsonl", lines.encode("utf-8")), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=batch_file.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        log.info("📦 Submitted batch %s with %d requests", batch.id, len(bodies))
+
+        attempt = 0
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            # Full jitter keeps concurrent batches from polling in lockstep
+            await asyncio.sleep(random.uniform(0, min(self.poll_interval, 2 ** attempt)))
+            attempt += 1
+            batch = await client.batches.retrieve(batch.id)
+        if batch.status != "completed" or batch.output_file_id is None:
+            raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+
+        results = [RuntimeError(f"No result for request {i} in batch {batch.id}") for i in range(len(bodies))]
+        output = await client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if response.get("status_code") == 200:
+                results[int(item["custom_id"])] = litellm.ModelResponse(**response["body"])
+            else:
+                results[int(item["custom_id"])] = RuntimeError(f"Batch request failed: {item.get('error') or response}")
+        return results
+
+
+@functools.lru_cache(maxsize=None)
+def get_batch_lm() -> BatchLM:
+    # Created on first use; mirrors the settings of the shared interactive LM
+    return BatchLM(
+        "openai/gpt-4.1-nano",
+        api_key=os.getenv("OPENAI_API_KEY"),
+        cache=False,
+        max_tokens=2048,
+    )
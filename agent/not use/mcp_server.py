@@ -9,6 +9,11 @@ def image_to_base64(image_path: str) -> str:
     """Convert image to base64"""
     return ImageToBase64().image_to_base64(image_path)
 
+@mcp.tool()
+def image_to_base64_file(image_path: str, out_path: str) -> str:
+    """Convert image to base64 and write it to out_path, returning the path"""
+    return ImageToBase64().to_file(image_path, out_path)
+
 @mcp.tool()
 def get_data_in_csv(csv_path: str) -> str:
     """Get the first row of data from the CSV file (excluding header)"""
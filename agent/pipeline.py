@@ -1,20 +1,31 @@
 import asyncio
+import logging
 import os
 import sys
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from agent_curl_generator import generate_curl_for_task
 from agent_execute_curl import execute_curl_for_task
 from agent_dspy_v8 import AutoUIGenerator
 
-async def process_task(task_name: str):
-    """Process a single task through all stages"""
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROBLEMS_DIR = os.path.join(BASE_DIR, "problems")
+
+_GENERATOR = None
+
+def _get_generator() -> AutoUIGenerator:
+    # One generator is shared by all tasks; its DSPy modules hold no per-task state
+    global _GENERATOR
+    if _GENERATOR is None:
+        _GENERATOR = AutoUIGenerator(max_parallel=int(os.getenv("PIPELINE_CONCURRENCY", "8")))
+    return _GENERATOR
+
+async def prepare_task(task_name: str):
+    """Run the curl stages for a single task"""
     print(f"\n{'='*50}")
     print(f"🚀 Starting processing for task: {task_name}")
     print(f"{'='*50}")
     
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    task_dir = os.path.join(base_dir, "problems", task_name)
-    
     # Stage 1: Generate curl command
     print("\n🔧 Stage 1: Generating curl command")
     try:
@@ -27,7 +38,7 @@ async def process_task(task_name: str):
     # Stage 2: Execute curl command
     print("\n⚡ Stage 2: Executing curl command")
     try:
-        success = execute_curl_for_task(task_name)
+        success = await asyncio.to_thread(execute_curl_for_task, task_name)
         if success:
             print(f"  ✅ Response saved for {task_name}")
         else:
@@ -37,45 +48,72 @@ async def process_task(task_name: str):
         print(f"  ❌ Error executing curl: {str(e)}")
         return False
     
-    # Stage 3: Generate UI
-    print("\n🎨 Stage 3: Generating UI")
-    try:
-        print("  📂 Loading task configuration...")
-        generator = AutoUIGenerator()
-        ui_html = generator.generate(task_dir)
-        
-        print("  💾 Saving UI...")
-        ui_path = generator.save(ui_html, task_dir, task_name)
-        
-        print(f"  ✅ UI generated successfully! Saved to: {ui_path}")
-        return True
-    except Exception as e:
-        print(f"  ❌ Error generating UI: {str(e)}")
-        print(f"  🔍 Error type: {type(e).__name__}")
-        traceback.print_exc()
-        return False
+    return True
+
+async def generate_uis(task_names):
+    """Generate and save the UIs of the prepared tasks, concurrently on this event loop"""
+    print(f"\n🎨 Stage 3: Generating UI for {len(task_names)} task(s)")
+    generator = _get_generator()
+    task_dirs = [os.path.join(PROBLEMS_DIR, task_name) for task_name in task_names]
+    results = await generator.agenerate_many(task_dirs)
+
+    succeeded = {}
+    for task_name, task_dir, ui_html in zip(task_names, task_dirs, results):
+        if isinstance(ui_html, Exception):
+            print(f"  ❌ Error generating UI for {task_name}: {str(ui_html)}")
+            print(f"  🔍 Error type: {type(ui_html).__name__}")
+            traceback.print_exception(ui_html)
+            succeeded[task_name] = False
+            continue
+        try:
+            ui_path = await asyncio.to_thread(generator.save, ui_html, task_dir, task_name)
+            print(f"  ✅ UI generated successfully! Saved to: {ui_path}")
+            succeeded[task_name] = True
+        except Exception as e:
+            print(f"  ❌ Error saving UI for {task_name}: {str(e)}")
+            succeeded[task_name] = False
+    return succeeded
 
 async def main():
-    # Get base directory
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    problems_dir = os.path.join(base_dir, "problems")
-    
+    # Blocking stages run in worker threads; size the pool for the concurrent fan-out
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=32))
+
     # Get all task folders
-    task_folders = [f for f in os.listdir(problems_dir) 
-                   if os.path.isdir(os.path.join(problems_dir, f))]
+    with os.scandir(PROBLEMS_DIR) as entries:
+        task_folders = [e.name for e in entries if e.is_dir()]
     
     # Process specific task if provided as argument
     if len(sys.argv) > 1:
         task_name = sys.argv[1]
         if task_name in task_folders:
-            await process_task(task_name)
+            if await prepare_task(task_name):
+                await generate_uis([task_name])
         else:
             print(f"❌ Task not found: {task_name}")
             sys.exit(1)
     else:
-        # Process all tasks
-        for task_name in task_folders:
-            await process_task(task_name)
+        # Prepare all tasks concurrently, bounded by PIPELINE_CONCURRENCY, then generate the
+        # UIs of the prepared ones together
+        sem = asyncio.Semaphore(int(os.getenv("PIPELINE_CONCURRENCY", "8")))
+
+        async def _guarded(task_name):
+            async with sem:
+                return await prepare_task(task_name)
+
+        results = await asyncio.gather(*[_guarded(name) for name in task_folders], return_exceptions=True)
+        ui_results = await generate_uis([name for name, result in zip(task_folders, results) if result is True])
+        results = [ui_results.get(name, result) for name, result in zip(task_folders, results)]
+
+        print(f"\n{'='*50}")
+        for task_name, result in zip(task_folders, results):
+            if isinstance(result, Exception):
+                print(f"❌ {task_name}: {type(result).__name__}: {result}")
+            elif result:
+                print(f"✅ {task_name}")
+            else:
+                print(f"❌ {task_name}")
 
 if __name__ == "__main__":
+    # The stage modules report through logging; show their INFO messages alongside the prints
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     asyncio.run(main())
\ No newline at end of file
@@ -1,16 +1,27 @@
+import os
+import functools
 import pandas as pd
 
+@functools.lru_cache(maxsize=32)
+def _first_row_json(csv_path: str, mtime_ns: int) -> str:
+    # Keyed on mtime so an edited file is read again; only the header and first row are parsed.
+    # dtypes are therefore inferred from that row alone: a column that later rows would make
+    # float or object (e.g. "1" then "2.5", or a later blank) comes out as 1 instead of 1.0.
+    # Accepted, since the tool only shows the LM an example row. pyarrow is not used because
+    # its JSON differs from pandas' for blanks, floats and datetimes.
+    df = pd.read_csv(csv_path, nrows=1)
+    if df.empty:
+        return "CSV file is empty."
+    first_row = df.iloc[0]
+    return first_row.to_json()
+
 class GetDataInCsv:
     def __init__(self):
         pass
 
     def get_data_in_csv(self, csv_path: str) -> str:
-        df = pd.read_csv(csv_path)
-        if df.empty:
-            return "CSV file is empty."
-        first_row = df.iloc[0]
-        return first_row.to_json() 
+        return _first_row_json(csv_path, os.stat(csv_path).st_mtime_ns)
 
 if __name__ == "__main__":
     csv_path = r"C:\Users\ASUS\Desktop\workspace\Automated_Visualization\backend\problems\text_classification_verified\data\goemotions.csv"
-    print(GetDataInCsv().get_data_in_csv(csv_path))
\ No newline at end of file
+    print(GetDataInCsv().get_data_in_csv(csv_path))
@@ -1,16 +1,55 @@
-import base64
+import binascii
+import mmap
+import os
+
+try:
+    # SIMD-accelerated encoder, used when installed
+    from pybase64 import b64encode as _b64encode
+except ImportError:
+    def _b64encode(data) -> bytes:
+        # Call the C encoder directly, skipping the base64 module's wrapper
+        return binascii.b2a_base64(data, newline=False)
+
+# Multiple of 3 so every chunk encodes without padding until the last one
+CHUNK_SIZE = 65535 - 65535 % 3
+# Below this size a plain read is cheaper than setting up a mapping
+MMAP_THRESHOLD = 1 << 16
 
 class ImageToBase64:
     def __init__(self):
         pass
 
-    def image_to_base64(self, image_path: str) -> str:
+    def _iter_encoded(self, image_path: str, chunk_size: int = CHUNK_SIZE, use_buffering: bool = False):
+        chunk_size = max(3, chunk_size - chunk_size % 3)
+        with open(image_path, "rb", buffering=-1 if use_buffering else 0) as image_file:
+            while True:
+                chunk = image_file.read(chunk_size)
+                if not chunk:
+                    break
+                yield _b64encode(chunk)
+
+    def image_to_base64(self, image_path: str, chunk_size: int = None, use_buffering: bool = False) -> str:
+        if chunk_size is not None:
+            encoded = bytearray()
+            for part in self._iter_encoded(image_path, chunk_size, use_buffering):
+                encoded += part
+            return encoded.decode("ascii")
+
         with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-        return encoded_string
+            if os.fstat(image_file.fileno()).st_size < MMAP_THRESHOLD:
+                return _b64encode(image_file.read()).decode("ascii")
+            # Encode large images straight from the page cache, without a bytes copy of the file
+            with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return _b64encode(mapped).decode("ascii")
+
+    def to_file(self, image_path: str, out_path: str, chunk_size: int = CHUNK_SIZE) -> str:
+        # Write the encoding chunk by chunk so the full base64 string never sits in memory
+        with open(out_path, "wb") as out_file:
+            for part in self._iter_encoded(image_path, chunk_size):
+                out_file.write(part)
+        return out_path
 
 if __name__ == "__main__":
     image_path = r"C:\Users\ASUS\Desktop\workspace\Automated_Visualization\backend\problems\object_detection_in_image\data\000000001257.jpg"
     print(ImageToBase64().image_to_base64(image_path))
-    with open("base64_image.txt", "w") as f:
-        f.write(ImageToBase64().image_to_base64(image_path))
\ No newline at end of file
+    ImageToBase64().to_file(image_path, "base64_image.txt")
\ No newline at end of file